@@ -1,5 +1,12 @@
 from google.cloud import bigquery
-client = bigquery.Client()
-print("Project:", client.project)
-datasets = list(client.list_datasets())
-print("Datasets:", [d.dataset_id for d in datasets])
+
+
+def main() -> None:
+    client = bigquery.Client()
+    print("Project:", client.project)
+    datasets = list(client.list_datasets())
+    print("Datasets:", [d.dataset_id for d in datasets])
+
+
+if __name__ == "__main__":
+    main()
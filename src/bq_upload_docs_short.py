@@ -1,14 +1,21 @@
 # src/bq_upload_docs_short.py
 # Upload docs_short.jsonl into BigQuery table rag_eval_lab.docs_short.
 # IMPORTANT BEHAVIOR:
-#   - This script TRUNCATES the target table before inserting.
+#   - This script REPLACES the target table contents (WRITE_TRUNCATE) on every run.
 #   - This makes the script idempotent: re-running it will not create duplicates.
-#   - Inserts are batched to avoid BigQuery streaming request size limits (413 errors).
+#   - Rows are uploaded with ONE load job instead of many streaming inserts:
+#     BigQuery parses the JSONL server-side, so there are no per-batch round-trips,
+#     no streaming quota, and no request size limits (413 errors).
 
-import json  # Parse JSONL lines into Python dicts (rows).
+import itertools  # Slice the first max_rows lines lazily.
+import os  # posix_fadvise read-ahead hint for the input file.
+import tempfile  # Temp file for uploading a row-capped prefix of the JSONL.
 from pathlib import Path  # Robust filesystem paths.
 
+import google.auth  # Application Default Credentials (ADC) lookup.
+from google.auth.transport.requests import AuthorizedSession  # Credentialed requests.Session.
 from google.cloud import bigquery  # BigQuery client library.
+from requests.adapters import HTTPAdapter  # Keep-alive connection pool per host.
 
 # -----------------------------
 # Configuration
@@ -20,6 +27,11 @@ TABLE = "docs_short"  # BigQuery table name.
 
 SRC = Path("data/processed/docs_short.jsonl")  # Input file produced by src/ingest_short.py.
 
+READ_BUFFER_BYTES = 1 << 20  # 1 MiB read buffer for the input JSONL.
+
+# HTTP session settings shared by every BigQuery API call in this script.
+HTTP_POOL_SIZE = 16  # Keep-alive connections kept open per host.
+
 # -----------------------------
 # BigQuery Schema (table columns)
 # -----------------------------
@@ -34,6 +46,30 @@ SCHEMA = [
 ]
 
 
+def make_http_session() -> AuthorizedSession:
+    """
+    Build one authorized HTTP session that all BigQuery calls reuse.
+
+    Why:
+      - Reusing keep-alive connections avoids paying a TCP + TLS handshake per API call
+        (table lookup, upload, job polling, ...).
+      - No transport-level retries: the BigQuery client already retries 429/5xx itself,
+        and needs to see those responses (a second retry layer would multiply attempts
+        and replace the HTTP error with a requests RetryError).
+
+    Output:
+      - AuthorizedSession using Application Default Credentials
+    """
+
+    credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+
+    session = AuthorizedSession(credentials)
+    session.mount("https://", adapter)
+    return session
+
+
 def ensure_table(client: bigquery.Client, dataset_id: str, table_id: str) -> str:
     """
     Ensure the BigQuery table exists; create it if missing.
@@ -61,34 +97,7 @@ def ensure_table(client: bigquery.Client, dataset_id: str, table_id: str) -> str
         return table.full_table_id
 
 
-def truncate_table(client: bigquery.Client, full_table_id: str) -> None:
-    """
-    TRUNCATE the target table (delete all rows, keep schema).
-
-    Why:
-      - BigQuery streaming inserts do not deduplicate automatically.
-      - If you run the same insert twice, you'll get duplicates.
-      - TRUNCATE ensures each run starts from a clean table.
-
-    Inputs:
-      - client: authenticated BigQuery client
-      - full_table_id: "<project>.<dataset>.<table>"
-    """
-
-    # Construct a TRUNCATE SQL statement.
-    # Backticks are required in BigQuery for fully qualified identifiers.
-    sql = f"TRUNCATE TABLE `{full_table_id}`"
-
-    # Execute the query as a job.
-    job = client.query(sql)
-
-    # Wait for completion so we know truncation finished before inserting new rows.
-    job.result()
-
-    print(f"Truncated table: {full_table_id}")
-
-
-def main(max_rows: int = 20000, batch_size: int = 200) -> None:
+def main(max_rows: int | None = None) -> None:
     """
     Main upload routine.
 
@@ -96,59 +105,56 @@ def main(max_rows: int = 20000, batch_size: int = 200) -> None:
       1) Ensure input JSONL exists
       2) Create BigQuery client
       3) Ensure table exists
-      4) TRUNCATE table to avoid duplicates
-      5) Read JSONL rows
-      6) Insert rows in batches using streaming inserts
+      4) Submit a single NDJSON load job that replaces the table contents
+      5) Wait for the job and report the loaded row count
 
     Inputs:
-      - max_rows: number of records to upload (default 20000)
-      - batch_size: rows per API request (default 200, prevents 413)
+      - max_rows: optional cap on records to upload (default None = the whole file;
+        the file size is already capped by src/ingest_short.py --n)
     """
 
     # 1) Verify input exists.
     assert SRC.exists(), f"Missing {SRC}. Run src/ingest_short.py first."
 
-    # 2) Create a BigQuery client (uses ADC by default).
-    client = bigquery.Client(project=PROJECT_ID)
+    # 2) Create a BigQuery client (uses ADC) on a shared keep-alive HTTP session.
+    session = make_http_session()
+    client = bigquery.Client(project=PROJECT_ID, credentials=session.credentials, _http=session)
 
     # 3) Ensure the table exists.
     full_table_id = ensure_table(client, DATASET, TABLE)
 
-    # 4) TRUNCATE the table before inserting to avoid duplicates.
-    truncate_table(client, full_table_id)
-
-    # 5) Read JSONL into a list of row dicts.
-    rows = []
-    with SRC.open("r", encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            if i >= max_rows:
-                break
-            # Parse each JSON line into a dict.
-            rows.append(json.loads(line))
-
-    # 6) Insert in batches to avoid request entity too large (413).
-    total_inserted = 0
-
-    for start in range(0, len(rows), batch_size):
-        batch = rows[start : start + batch_size]
-
-        # insert_rows_json returns [] on success; otherwise it returns error details.
-        errors = client.insert_rows_json(full_table_id, batch)
-
-        if errors:
-            # If errors occur, stop and show a small subset to debug.
-            raise RuntimeError(f"Insert errors near row {start} (first 3): {errors[:3]}")
-
-        total_inserted += len(batch)
-
-        # Print progress every 2000 rows so you can see it moving.
-        if total_inserted % 2000 == 0:
-            print(f"Inserted {total_inserted}/{len(rows)}...")
+    # 4) Configure a JSONL load job.
+    # WRITE_TRUNCATE replaces the table atomically, so no separate TRUNCATE query is needed.
+    job_config = bigquery.LoadJobConfig(
+        schema=SCHEMA,
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition="WRITE_TRUNCATE",
+    )
+
+    # 5) Upload the raw bytes; BigQuery parses each JSON line server-side.
+    with open(SRC, "rb", buffering=READ_BUFFER_BYTES) as f:
+        # The file is streamed once from start to end, so let the kernel read ahead (Linux only).
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if max_rows is None:
+            job = client.load_table_from_file(f, full_table_id, job_config=job_config, rewind=True)
+        else:
+            # Stream only the first max_rows lines (raw bytes; no client-side JSON parsing).
+            # A disk-backed temp file keeps peak memory bounded no matter how large max_rows is.
+            # (Not SpooledTemporaryFile: while in memory it reports mode "w+b", which
+            # load_table_from_file rejects as text mode; TemporaryFile reports "rb+".)
+            with tempfile.TemporaryFile() as head:
+                head.writelines(itertools.islice(f, max_rows))
+                job = client.load_table_from_file(head, full_table_id, job_config=job_config, rewind=True)
+
+    # 6) Wait for completion (raises if BigQuery reports row errors).
+    job.result()
 
-    print(f"Inserted {total_inserted} rows into {full_table_id}")
+    print(f"Loaded {job.output_rows} rows into {full_table_id}")
 
 
 if __name__ == "__main__":
     # Optional: add CLI arguments later if you want.
-    # For now, defaults are max_rows=20000 and batch_size=200.
+    # For now, the default uploads the whole file produced by src/ingest_short.py.
     main()
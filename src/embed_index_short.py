@@ -1,13 +1,28 @@
 # src/embed_index_short.py
 # Build embeddings for chunk texts and create a FAISS index (local retrieval backend).
 
-import time  # For measuring runtime and printing useful timing info.
+import sys
 from pathlib import Path  # For robust path manipulation.
 
+# Add the project root to Python path so "import src..." works when run as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import hashlib  # For content-hashing chunk texts into an embedding cache key.
+import shutil  # For copying the chunk Parquet as metadata, and replacing the metadata array folder.
+import time  # For measuring runtime and printing useful timing info.
+
 import numpy as np  # For working with embedding arrays.
-import pandas as pd  # For loading/saving Parquet metadata tables.
+import pyarrow as pa  # For pulling raw string buffers out of Arrow columns.
+import pyarrow.parquet as pq  # For loading/saving Parquet tables without a pandas round-trip.
 import faiss  # FAISS library for fast similarity search over vectors.
 from sentence_transformers import SentenceTransformer  # Local embedding model loader.
+from sentence_transformers import export_dynamic_quantized_onnx_model  # ONNX int8 export helper.
+
+# Embedding model + its int8 ONNX export location, shared with retrieval so queries and
+# chunks are always embedded by the same model file.
+from src.rag_retrieve import MODEL_NAME, ONNX_MODEL_DIR, ONNX_QUANT_CONFIG, ONNX_FILE_NAME, load_onnx_model
 
 # -----------------------------
 # Configuration
@@ -21,17 +36,181 @@ OUT_DIR = Path("data/processed/index_short")
 FAISS_INDEX_PATH = OUT_DIR / "faiss.index"
 META_PATH = OUT_DIR / "chunks_meta.parquet"
 
-# Embedding model choice (you selected this).
-MODEL_NAME = "all-mpnet-base-v2"
+# The same metadata as plain .npy arrays, which retrieve_short_demo.py memory-maps so only
+# the rows FAISS returns are ever read from disk.
+# - numeric column c: c.npy
+# - string column c: c.bytes.npy (all values as one UTF-8 blob) + c.offsets.npy
+#   (value i is bytes[offsets[i]:offsets[i + 1]])
+META_NPY_DIR = OUT_DIR / "meta_npy"
+
+# Embeddings cached by content hash (see embedding_cache_key), so unchanged inputs skip encoding.
+# Stored as float16 .npy files and memory-mapped rather than loaded into RAM.
+# Only the most recent key is kept: older files are deleted after a new one is written.
+EMB_CACHE_DIR = OUT_DIR / "emb_cache"
+
+# Metadata columns kept at retrieval time (aligned to FAISS rows).
+META_COLS = ["chunk_id", "doc_id", "source", "title", "chunk_index", "char_start", "char_end", "text"]
 
 # Batch size for embedding computation.
 # Larger batches can be faster but use more memory; adjust if needed.
 BATCH_SIZE = 64
 
+# Number of texts passed to each model.encode() call; its output is written to disk before
+# the next block, which bounds the FP32 working memory.
+ENCODE_BLOCK = 4096
+
 # Number of chunks to process (None means "all chunks").
 # You can set this to a smaller number for quick debugging, e.g., 5000.
 LIMIT_CHUNKS = None
 
+# HNSW graph parameters for the FAISS index.
+# - HNSW_M: neighbors per node (more = better recall, bigger index).
+# - HNSW_EF_CONSTRUCTION: candidate list size while building (more = better graph, slower build).
+# - HNSW_EF_SEARCH: default candidate list size at query time (saved with the index;
+#   retrieval raises it to the number of requested candidates, see rag_retrieve.hnsw_search_params).
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+
+def ensure_onnx_export() -> None:
+    """
+    Create the int8-quantized ONNX export of MODEL_NAME if it does not exist yet.
+
+    Runs on every indexing run (even when embeddings come from the cache), because the
+    retrieval scripts load this export and tell the user to re-run this script if it is missing.
+
+    Output:
+      - None (writes ONNX_MODEL_DIR on first use)
+    """
+
+    # We encode with the int8-quantized ONNX export of MODEL_NAME (see src/rag_retrieve.py).
+    # int8 matmuls (VNNI on x86, dot-product instructions on ARM) are several times faster
+    # than FP32 PyTorch, with negligible retrieval quality loss.
+    # First run: export the model to ONNX, save it locally, then add the int8 variant.
+    if not (ONNX_MODEL_DIR / ONNX_FILE_NAME).exists():
+        print(f"Exporting {MODEL_NAME} to int8 ONNX ({ONNX_QUANT_CONFIG}) -> {ONNX_MODEL_DIR}")
+        fp32_model = SentenceTransformer(MODEL_NAME, backend="onnx", device="cpu")
+        fp32_model.save(str(ONNX_MODEL_DIR))
+        export_dynamic_quantized_onnx_model(fp32_model, ONNX_QUANT_CONFIG, str(ONNX_MODEL_DIR))
+
+
+def embedding_cache_key(texts: list[str]) -> str:
+    """
+    Content hash identifying one embedding run (model variant + exact chunk texts).
+
+    Output:
+      - hex digest used as the cache file name
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{MODEL_NAME}|{ONNX_FILE_NAME}|{len(texts)}".encode())
+    for t in texts:
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")  # Separator so ["ab", "c"] and ["a", "bc"] hash differently.
+    return h.hexdigest()
+
+
+def encode_texts(model: SentenceTransformer, texts: list[str], out_path: Path) -> np.ndarray:
+    """
+    Embed texts as normalized vectors into a float16 .npy file on disk.
+
+    Duplicate texts are encoded once and their vector copied to every matching row.
+    Vectors are written block by block into a memory-mapped array, so RAM holds only one
+    block of FP32 model output at a time. float16 halves the bytes per vector.
+
+    Inputs:
+      - model: embedding model
+      - texts: chunk texts to embed
+      - out_path: .npy file to create (written to a temp name, renamed when complete)
+
+    Output:
+      - read-only memory-mapped float16 array of shape (len(texts), dim), row-aligned with texts
+    """
+
+    # Deduplicate: identical chunk texts (boilerplate, repeated contexts) are encoded only once.
+    # inverse[i] is the position of texts[i] in unique_texts.
+    unique_ids = {}
+    inverse = np.fromiter(
+        (unique_ids.setdefault(t, len(unique_ids)) for t in texts), dtype=np.int64, count=len(texts)
+    )
+    unique_texts = list(unique_ids)
+    print(f"Unique texts to encode: {len(unique_texts)} of {len(texts)}")
+
+    # Encode in length-sorted order: each batch is padded to its longest text, so grouping
+    # similar lengths together avoids wasting compute on padding tokens.
+    order = np.argsort([len(t) for t in unique_texts], kind="stable")  # Sorted position -> unique id.
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))  # Unique id -> sorted position.
+
+    # Group chunk rows by the sorted position of their text, so each encoded block maps to
+    # one contiguous run of rows_by_rank.
+    row_rank = rank[inverse]
+    rows_by_rank = np.argsort(row_rank, kind="stable")
+    sorted_row_rank = row_rank[rows_by_rank]
+
+    # Preallocate the on-disk embedding matrix (one row per chunk, duplicates included).
+    tmp_path = out_path.with_suffix(".tmp.npy")
+    dim = model.get_sentence_embedding_dimension()
+    embeddings = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(len(texts), dim))
+
+    for start in range(0, len(unique_texts), ENCODE_BLOCK):
+        block = order[start : start + ENCODE_BLOCK]
+
+        # We request numpy output and normalize embeddings so cosine similarity works well.
+        block_embeddings = model.encode(
+            [unique_texts[u] for u in block],
+            batch_size=BATCH_SIZE,
+            convert_to_numpy=True,    # Return embeddings as a numpy array.
+            normalize_embeddings=True # Normalize vectors; enables cosine via dot product.
+        ).astype(np.float16)
+
+        # Scatter back to every chunk row using these texts, so embedding row i belongs to text i.
+        lo, hi = np.searchsorted(sorted_row_rank, [start, start + len(block)])
+        embeddings[rows_by_rank[lo:hi]] = block_embeddings[sorted_row_rank[lo:hi] - start]
+        print(f"  encoded {start + len(block)}/{len(unique_texts)}")
+
+    # Flush to disk, then publish under the final name (a crashed run leaves no partial cache).
+    embeddings.flush()
+    del embeddings
+    tmp_path.replace(out_path)
+
+    return np.load(out_path, mmap_mode="r")
+
+
+def save_meta_arrays(table: pa.Table, out_dir: Path) -> None:
+    """
+    Save each metadata column as memory-mappable .npy arrays (layout: see META_NPY_DIR).
+
+    Strings are stored as a UTF-8 blob plus int64 offsets rather than a pickled object
+    array, because object arrays cannot be memory-mapped.
+
+    Inputs:
+      - table: metadata table aligned with FAISS rows
+      - out_dir: destination folder (replaced: files from an earlier column set are removed,
+        since readers pick up every .npy in it)
+
+    Output:
+      - None (writes files)
+    """
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    for name in table.column_names:
+        col = table.column(name).combine_chunks()
+
+        if not pa.types.is_string(col.type) and not pa.types.is_large_string(col.type):
+            np.save(out_dir / f"{name}.npy", col.to_numpy())
+            continue
+
+        # Arrow already stores strings as offsets + one UTF-8 data buffer; reuse those buffers.
+        col = col.cast(pa.large_string())
+        _, offsets_buf, data_buf = col.buffers()
+        offsets = np.frombuffer(offsets_buf, dtype=np.int64)[col.offset : col.offset + len(col) + 1]
+        data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.empty(0, np.uint8)
+        np.save(out_dir / f"{name}.bytes.npy", data[offsets[0] : offsets[-1]])
+        np.save(out_dir / f"{name}.offsets.npy", offsets - offsets[0])
+
 
 def main() -> None:
     """
@@ -51,67 +230,84 @@ def main() -> None:
     # 2) Ensure output directory exists.
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # 3) Load chunk table from Parquet into a pandas DataFrame.
+    # 3) Load the chunk table from Parquet as an Arrow table (no pandas conversion).
     # This table contains one row per chunk: chunk_id, doc_id, title, text, etc.
-    df = pd.read_parquet(CHUNKS_PARQUET)
+    # The same table feeds the texts to embed and both metadata outputs (step 11/12).
+    # If the file holds exactly META_COLS and we keep every row, the metadata Parquet can be a
+    # byte-for-byte copy of it instead of being re-encoded.
+    copy_meta = LIMIT_CHUNKS is None and set(pq.read_schema(CHUNKS_PARQUET).names) == set(META_COLS)
+    table = pq.read_table(CHUNKS_PARQUET, columns=META_COLS)
 
     # 4) Optionally limit the number of chunks (useful for debugging).
     if LIMIT_CHUNKS is not None:
-        df = df.iloc[:LIMIT_CHUNKS].copy()
+        table = table.slice(0, LIMIT_CHUNKS)
 
     # 5) Extract the chunk texts we want to embed.
-    # Ensure they are strings (defensive).
-    texts = df["text"].astype(str).tolist()
-
-    # 6) Load the Sentence-Transformers embedding model.
-    # This will download weights the first time and cache them locally.
-    print(f"Loading embedding model: {MODEL_NAME}")
-    model = SentenceTransformer(MODEL_NAME)
-    # Prevent multiprocessing instability on some Mac setups
-    model._target_device = "cpu"
-    
-    # 7) Compute embeddings in batches.
-    # We request numpy output and normalize embeddings so cosine similarity works well.
+    texts = table.column("text").to_pylist()
+
+    # 6) Make sure the ONNX model export exists (retrieval needs it even on a cache hit).
+    # This will download + export weights the first time and cache them locally.
+    ensure_onnx_export()
+
+    # 7) Reuse cached embeddings when the texts and model are unchanged.
+    # Re-running the pipeline (e.g., to try another FAISS index) then skips encoding entirely.
     t0 = time.time()
-    print(f"Encoding {len(texts)} chunks (batch_size={BATCH_SIZE})...")
-
-    embeddings = model.encode(
-        texts,
-        batch_size=BATCH_SIZE,
-        show_progress_bar=True,   # Show a progress bar in the terminal.
-        convert_to_numpy=True,    # Return embeddings as a numpy array.
-        normalize_embeddings=True # Normalize vectors; enables cosine via dot product.
-    )
+    cache_path = EMB_CACHE_DIR / f"{embedding_cache_key(texts)}.npy"
+
+    if cache_path.exists():
+        print(f"Loading cached embeddings: {cache_path}")
+        embeddings = np.load(cache_path, mmap_mode="r")
+    else:
+        # Cache miss: load the Sentence-Transformers embedding model (int8 ONNX, CPU) and encode.
+        print(f"Loading embedding model: {MODEL_NAME} (ONNX int8, {ONNX_QUANT_CONFIG})")
+        model = load_onnx_model()
 
-    # 8) Ensure embeddings are float32, which FAISS expects for most index types.
-    embeddings = embeddings.astype(np.float32)
+        print(f"Encoding {len(texts)} chunks (batch_size={BATCH_SIZE})...")
+        EMB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        embeddings = encode_texts(model, texts, cache_path)
+        print(f"Cached embeddings to: {cache_path}")
+
+        # Drop caches of earlier chunk sets (and leftovers of crashed runs); each is N x dim x 2 bytes.
+        for old_path in EMB_CACHE_DIR.glob("*.npy"):
+            if old_path != cache_path:
+                old_path.unlink()
 
     t1 = time.time()
     print(f"Embeddings shape: {embeddings.shape} (computed in {t1 - t0:.1f}s)")
 
-    # 9) Build a FAISS index.
+    # 8) Build a FAISS index.
     # For normalized vectors, inner product (dot product) corresponds to cosine similarity.
+    # HNSW is an approximate graph index: queries take ~O(log N) instead of a full O(N) scan.
+    # Vectors are stored as float16 (scalar quantizer), matching our embedding precision
+    # and halving index memory compared to float32.
     dim = embeddings.shape[1]  # Embedding dimension (e.g., 768 for mpnet).
-    index = faiss.IndexFlatIP(dim)  # Flat (exact) index using inner product similarity.
+    index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
 
-    # 10) Add vectors to the index.
+    # 9) Add vectors to the index.
     # The order of vectors in FAISS is exactly the order we add them.
-    index.add(embeddings)
+    # FAISS takes float32 input, so convert one block at a time instead of the whole matrix.
+    for start in range(0, len(embeddings), ENCODE_BLOCK):
+        index.add(np.asarray(embeddings[start : start + ENCODE_BLOCK], dtype=np.float32))
 
     print(f"FAISS index built. Total vectors: {index.ntotal}")
 
-    # 11) Save the FAISS index to disk.
+    # 10) Save the FAISS index to disk.
     faiss.write_index(index, str(FAISS_INDEX_PATH))
     print(f"Saved FAISS index to: {FAISS_INDEX_PATH}")
 
-    # 12) Save metadata aligned to the index rows.
-    # Keep only columns you want at retrieval time.
-    meta_cols = ["chunk_id", "doc_id", "source", "title", "chunk_index", "char_start", "char_end", "text"]
-    meta = df[meta_cols].copy()
-
-    meta.to_parquet(META_PATH, index=False)
+    # 11) Save metadata aligned to the index rows (a file copy, or straight from Arrow).
+    if copy_meta:
+        shutil.copyfile(CHUNKS_PARQUET, META_PATH)
+    else:
+        pq.write_table(table, META_PATH)
     print(f"Saved metadata to: {META_PATH}")
 
+    # 12) Save the same metadata as memory-mappable arrays for fast retrieval start-up.
+    save_meta_arrays(table, META_NPY_DIR)
+    print(f"Saved metadata arrays to: {META_NPY_DIR}")
+
     print("Done.")
 
 
@@ -7,9 +7,11 @@
 #   - a short preview of the first N records
 
 import argparse  # For parsing command-line arguments like --path and --n.
-import json  # For loading each line (JSON string) into a Python dict.
 from pathlib import Path  # For robust path handling.
 
+import numpy as np  # For vectorized text-length statistics.
+import orjson  # Fast (Rust) parser for loading each line (JSON string) into a Python dict.
+
 # -----------------------------
 # Default settings
 # -----------------------------
@@ -17,6 +19,8 @@ from pathlib import Path  # For robust path handling.
 DEFAULT_PATH = Path("data/processed/docs_short.jsonl")  # Default JSONL to inspect.
 DEFAULT_PREVIEW_N = 3  # Default number of records to print as a preview.
 DEFAULT_SAMPLE_FOR_KEYS = 200  # How many records to scan to infer keys (keeps it fast).
+READ_BUFFER_BYTES = 64 * 1024  # Read in 64 KB chunks (fewer read syscalls than the 8 KB default).
+COUNT_CHUNK_BYTES = 1 << 20  # Read 1 MB at a time when only counting lines past the sample.
 
 
 def safe_preview(text: str, max_chars: int = 200) -> str:
@@ -65,44 +69,72 @@ def main(path: Path, preview_n: int, sample_for_keys: int) -> None:
     # 2) Initialize counters and containers for summary stats.
     total_lines = 0  # Total number of records in the file (one record per line).
     key_union = set()  # Union of keys found across sampled records.
-    text_lengths = []  # Store lengths of the "text" field when present (for sampled records).
-    previews = []  # Store the first preview_n parsed records for printing later.
-
-    # 3) Read the file line-by-line (streaming) to handle large files safely.
-    with path.open("r", encoding="utf-8") as f:
+    text_lengths = np.empty(max(sample_for_keys, 0), dtype=np.int32)  # Lengths of "text" (sampled records).
+    n_text = 0  # How many entries of text_lengths are filled.
+    previews = []  # First preview_n records as (doc_id, title, source, has_text, text) for printing later.
+
+    # 3) Read the sampled prefix line-by-line (streaming) to handle large files safely.
+    # The file is opened in binary mode: orjson parses bytes directly, and the bulk count
+    # below never needs to decode text.
+    with path.open("rb", buffering=READ_BUFFER_BYTES) as f:
         for line_idx, line in enumerate(f):
             total_lines += 1  # Count every line as a record.
 
+            # Past the sample window with all previews collected, the rest of the file only
+            # needs counting, which step 4 does without splitting it into lines.
+            if line_idx >= sample_for_keys and len(previews) >= preview_n:
+                break
+
             # Skip empty lines defensively (shouldn't happen, but avoids errors).
             if not line.strip():
                 continue
 
             # Parse one JSON object from the line.
             try:
-                obj = json.loads(line)
-            except json.JSONDecodeError as e:
+                obj = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
                 # If the JSON is malformed, show a helpful error with line number.
                 raise ValueError(f"Invalid JSON on line {line_idx + 1}: {e}") from e
 
-            # Save the first few objects for preview printing.
+            # Check the record type once; the preview and stats code below branch on it.
+            is_dict = isinstance(obj, dict)
+
+            # Save the fields of the first few records for preview printing, with placeholders
+            # filled in here so the print loop needs no type checks.
             if len(previews) < preview_n:
-                previews.append(obj)
+                if is_dict:
+                    get = obj.get
+                    previews.append((
+                        get("doc_id", "(no doc_id)"),
+                        get("title", ""),
+                        get("source", ""),
+                        "text" in obj,
+                        get("text", ""),
+                    ))
+                else:
+                    previews.append(("(non-dict record)", "", "", False, ""))
 
             # For key union + text stats, only sample the first `sample_for_keys` records for speed.
             if line_idx < sample_for_keys:
                 # Update the union of keys (works if obj is a dict).
-                if isinstance(obj, dict):
+                if is_dict:
                     key_union.update(obj.keys())
 
                     # If there's a "text" field, collect its length.
                     if "text" in obj and obj["text"] is not None:
-                        text_lengths.append(len(str(obj["text"])))
-
-            # If we've already collected enough previews AND scanned enough for keys,
-            # we still continue counting total_lines, because the total count matters.
-            # (But note: we are only collecting key/text stats from the sampled subset.)
-
-    # 4) Print summary statistics.
+                        text_lengths[n_text] = len(str(obj["text"]))
+                        n_text += 1
+
+        # 4) Count the remaining lines in bulk: newline bytes per 1 MB chunk (runs in C).
+        # A final line without a trailing newline still counts as a record.
+        last_chunk = b""
+        while chunk := f.read(COUNT_CHUNK_BYTES):
+            total_lines += chunk.count(b"\n")
+            last_chunk = chunk
+        if last_chunk and not last_chunk.endswith(b"\n"):
+            total_lines += 1
+
+    # 5) Print summary statistics.
     print("=" * 60)
     print(f"JSONL path: {path}")
     print(f"Total records (lines): {total_lines}")
@@ -115,31 +147,27 @@ def main(path: Path, preview_n: int, sample_for_keys: int) -> None:
     else:
         print("Keys found: (none detected in sampled records)")
 
-    # Print text length stats if we collected any.
-    if text_lengths:
-        avg_len = sum(text_lengths) / len(text_lengths)
-        print(f"Text length stats (sampled {len(text_lengths)} records with 'text'):")
+    # Print text length stats if we collected any (vectorized over the filled part of the array).
+    if n_text:
+        lengths = text_lengths[:n_text]
+        avg_len = lengths.mean()  # Accumulated in float64, so int32 lengths cannot overflow.
+        print(f"Text length stats (sampled {n_text} records with 'text'):")
         print(f"  avg chars: {avg_len:.1f}")
-        print(f"  min chars: {min(text_lengths)}")
-        print(f"  max chars: {max(text_lengths)}")
+        print(f"  min chars: {lengths.min()}")
+        print(f"  max chars: {lengths.max()}")
     else:
         print("Text length stats: no 'text' field found in sampled records (or all were empty).")
 
-    # 5) Print preview of the first few records.
+    # 6) Print preview of the first few records.
     print("-" * 60)
     print(f"Preview: first {len(previews)} record(s)")
-    for i, obj in enumerate(previews, start=1):
-        # Extract common fields if they exist; otherwise show placeholders.
-        doc_id = obj.get("doc_id", "(no doc_id)") if isinstance(obj, dict) else "(non-dict record)"
-        title = obj.get("title", "") if isinstance(obj, dict) else ""
-        source = obj.get("source", "") if isinstance(obj, dict) else ""
-
+    for i, (doc_id, title, source, has_text, text) in enumerate(previews, start=1):
         # Print a compact header.
         print(f"[{i}] doc_id={doc_id}  source={source}  title={safe_preview(title, 80)}")
 
         # Print a short preview of the text if present.
-        if isinstance(obj, dict) and "text" in obj:
-            print(f"    text_preview: {safe_preview(obj.get('text', ''), 240)}")
+        if has_text:
+            print(f"    text_preview: {safe_preview(text, 240)}")
 
     print("=" * 60)
     print("Done.")
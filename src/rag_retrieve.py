@@ -14,6 +14,7 @@
 #   Streamlit reruns your script on each interaction, but the Python process often persists.
 #   Module-level cached objects avoid expensive reloads on each rerun.
 
+import platform  # Pick the same int8 ONNX variant that embed_index_short.py exported.
 import time  # Measure retrieval latency.
 from pathlib import Path  # Handle paths robustly.
 
@@ -30,7 +31,15 @@ OUT_DIR = Path("data/processed/index_short")  # Default index folder
 FAISS_INDEX_PATH = OUT_DIR / "faiss.index"  # FAISS index file
 META_PATH = OUT_DIR / "chunks_meta.parquet"  # metadata aligned with index rows
 
-MODEL_NAME = "all-mpnet-base-v2"  # Must match indexing model
+MODEL_NAME = "all-mpnet-base-v2"  # Embedding model (indexing imports it from here)
+
+# The int8-quantized ONNX export of MODEL_NAME (ONNX Runtime on CPU).
+# embed_index_short.py creates it and embeds the chunks with it; retrieval embeds queries with
+# the same file. These are the only definitions: both scripts import them from this module,
+# so query and chunk vectors cannot silently come from different models.
+ONNX_MODEL_DIR = Path("data/models") / f"{MODEL_NAME}-onnx"
+ONNX_QUANT_CONFIG = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx512_vnni"
+ONNX_FILE_NAME = f"onnx/model_qint8_{ONNX_QUANT_CONFIG}.onnx"
 
 # -----------------------------
 # Module-level caches (persist across Streamlit reruns)
@@ -41,6 +50,48 @@ _cached_index = None  # Will hold the FAISS index after first load
 _cached_meta = None   # Will hold the metadata DataFrame after first load
 
 
+def load_onnx_model() -> SentenceTransformer:
+    """
+    Load the int8 ONNX export of MODEL_NAME (written by embed_index_short.py).
+
+    Output:
+      - SentenceTransformer running on the ONNX Runtime CPU backend
+    """
+    if not (ONNX_MODEL_DIR / ONNX_FILE_NAME).exists():
+        raise FileNotFoundError(
+            f"Missing {ONNX_MODEL_DIR / ONNX_FILE_NAME}. Run: uv run python src/embed_index_short.py"
+        )
+    return SentenceTransformer(
+        str(ONNX_MODEL_DIR),
+        backend="onnx",
+        device="cpu",  # ONNX Runtime CPU execution provider.
+        model_kwargs={"file_name": ONNX_FILE_NAME},
+    )
+
+
+def hnsw_search_params(index: faiss.Index, k_candidates: int):
+    """
+    Build per-search HNSW parameters that explore at least k_candidates graph nodes.
+
+    Why:
+      - An HNSW search returns at most efSearch good candidates; FAISS does not raise efSearch
+        to k by itself, so asking for more candidates than the saved efSearch loses recall.
+      - The floor is the efSearch saved in the index file (set by embed_index_short.py).
+        Passing it per search leaves the (possibly cached) index itself unchanged.
+
+    Inputs:
+      - index: loaded FAISS index
+      - k_candidates: number of neighbors requested from index.search
+
+    Output:
+      - faiss.SearchParametersHNSW for index.search(..., params=...), or None for
+        non-HNSW indexes (e.g. a flat index from an older build), which need no tuning
+    """
+    if not hasattr(index, "hnsw"):
+        return None
+    return faiss.SearchParametersHNSW(efSearch=max(index.hnsw.efSearch, k_candidates))
+
+
 def _load_model() -> SentenceTransformer:
     """
     Lazily load the embedding model and cache it.
@@ -54,8 +105,8 @@ def _load_model() -> SentenceTransformer:
     if _cached_model is not None:
         return _cached_model
 
-    # Otherwise load from disk/cache (may download on first ever use).
-    _cached_model = SentenceTransformer(MODEL_NAME)
+    # Otherwise load the local int8 ONNX export (written by embed_index_short.py).
+    _cached_model = load_onnx_model()
     return _cached_model
 
 
@@ -141,7 +192,8 @@ def retrieve(
     k_candidates = max(k * candidate_multiplier, k)
 
     # FAISS search returns (scores, idxs) shaped (1, k_candidates).
-    scores, idxs = index.search(q_vec, k_candidates)
+    # HNSW explores at least k_candidates nodes so the extra candidates keep their recall.
+    scores, idxs = index.search(q_vec, k_candidates, params=hnsw_search_params(index, k_candidates))
     scores = scores[0]
     idxs = idxs[0]
 
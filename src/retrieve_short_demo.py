@@ -6,15 +6,15 @@
 #     2) a metadata table aligned with the FAISS index rows
 #
 #   It:
-#     - embeds a user query using the same Sentence-Transformers model as indexing
-#     - retrieves top candidates from FAISS
+#     - embeds one or more user queries (in one batch) using the same int8 ONNX model export as indexing
+#     - retrieves top candidates from FAISS (all queries in one batched search)
 #     - deduplicates results by a user-chosen field (doc_id by default; title optional)
 #     - prints the final top-k results
 #
 # Inputs:
 #   - FAISS index: data/processed/index_short/faiss.index
-#   - metadata:   data/processed/index_short/chunks_meta.parquet
-#   - CLI args:   --query, --k, --dedupe_field, --candidate_multiplier
+#   - metadata:   data/processed/index_short/meta_npy/ (memory-mapped .npy column arrays)
+#   - CLI args:   --query, --queries_file or --server, --k, --dedupe_field, --candidate_multiplier
 #
 # Outputs:
 #   - prints ranked retrieval results to stdout
@@ -26,31 +26,49 @@
 #   # Dedupe by title (more topic-diverse, but may return <k if neighbors share titles)
 #   uv run python src/retrieve_short_demo.py --query "How did Beyonce become popular?" --k 5 --dedupe_field title
 #
+#   # Many queries at once (one per line); the model is loaded once and queries are batch-encoded
+#   uv run python src/retrieve_short_demo.py --queries_file queries.txt --k 5
+#
+#   # Interactive: load the model + index once, then type queries (Ctrl-D to quit)
+#   uv run python src/retrieve_short_demo.py --server --k 5
+#
 # Success criteria:
 #   - The script prints results and the dedupe key is unique across printed rows (as much as data allows)
 
 
-import argparse  # Parse command-line arguments like --query, --k, --dedupe_field.
+import sys
 from pathlib import Path  # Work with filesystem paths safely.
 
+# Add the project root to Python path so "import src..." works when run as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse  # Parse command-line arguments like --query, --k, --dedupe_field.
+import os  # CPU count for FAISS OpenMP threads.
+
 import numpy as np  # Handle vectors and ensure correct dtype for FAISS.
-import pandas as pd  # Load metadata (Parquet).
 import faiss  # Load/search the FAISS vector index.
 from sentence_transformers import SentenceTransformer  # Embed the query into a dense vector.
 
+# Shared with rag_retrieve: the int8 ONNX model loader used for indexing (queries and chunks
+# share one model file) and the per-search HNSW efSearch parameters.
+from src.rag_retrieve import hnsw_search_params, load_onnx_model
+
 # -----------------------------
 # Configuration: file paths
 # -----------------------------
 
 OUT_DIR = Path("data/processed/index_short")  # Output directory from embed_index_short.py
 FAISS_INDEX_PATH = OUT_DIR / "faiss.index"  # FAISS index file
-META_PATH = OUT_DIR / "chunks_meta.parquet"  # Metadata table aligned to index rows
+META_NPY_DIR = OUT_DIR / "meta_npy"  # Metadata column arrays aligned to index rows (Must match embed_index_short.py)
 
 # -----------------------------
 # Configuration: embedding model
 # -----------------------------
 
-MODEL_NAME = "all-mpnet-base-v2"  # Must match embed_index_short.py
+# The model itself (int8 ONNX export of MODEL_NAME) is defined in src/rag_retrieve.py.
+QUERY_BATCH_SIZE = 32  # Queries encoded per forward pass when several are given.
 
 
 def safe_preview(text: str, max_chars: int = 240) -> str:
@@ -72,95 +90,80 @@ def safe_preview(text: str, max_chars: int = 240) -> str:
     return s if len(s) <= max_chars else s[:max_chars] + "..."  # Truncate if needed.
 
 
-def main(query: str, k: int, dedupe_field: str, candidate_multiplier: int) -> None:
+class StringColumn:
     """
-    Run retrieval demo.
+    Read-only view of a string column saved by embed_index_short.save_meta_arrays.
 
-    Steps:
-      1) Validate index and metadata files exist
-      2) Load FAISS index
-      3) Load metadata
-      4) Validate dedupe_field exists in metadata
-      5) Embed query
-      6) Retrieve candidates from FAISS
-      7) Deduplicate by dedupe_field
-      8) Print results
-
-    Inputs:
-      - query: query string to embed and search
-      - k: number of final results to return (after deduplication)
-      - dedupe_field: metadata column name used to enforce diversity (e.g., doc_id, title)
-      - candidate_multiplier: retrieve k * multiplier before dedupe to increase diversity
+    Both arrays are memory-mapped, so looking up row i only reads that row's bytes from disk.
     """
 
-    # -----------------------------
-    # Step 1: sanity-check files exist
-    # -----------------------------
-
-    if not FAISS_INDEX_PATH.exists():
-        raise FileNotFoundError(
-            f"Missing {FAISS_INDEX_PATH}. Run: uv run python src/embed_index_short.py"
-        )
-
-    if not META_PATH.exists():
-        raise FileNotFoundError(
-            f"Missing {META_PATH}. Run: uv run python src/embed_index_short.py"
-        )
-
-    # -----------------------------
-    # Step 2: load index and metadata
-    # -----------------------------
-
-    index = faiss.read_index(str(FAISS_INDEX_PATH))  # Load FAISS index from disk
-    meta = pd.read_parquet(META_PATH)  # Load metadata aligned with FAISS row order
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data  # uint8 UTF-8 blob holding every value back to back
+        self.offsets = offsets  # int64, value i is data[offsets[i]:offsets[i + 1]]
 
-    # -----------------------------
-    # Step 3: validate dedupe_field
-    # -----------------------------
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
 
-    if dedupe_field not in meta.columns:
-        raise ValueError(
-            f"dedupe_field='{dedupe_field}' not in metadata columns.\n"
-            f"Available columns: {list(meta.columns)}\n"
-            f"Tip: try --dedupe_field doc_id or --dedupe_field title"
-        )
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
 
-    # -----------------------------
-    # Step 4: embed query
-    # -----------------------------
 
-    model = SentenceTransformer(MODEL_NAME)  # Load embedding model (cached after first download)
-    q_vec = model.encode(
-        [query],                   # encode expects list[str]; we embed one query
-        convert_to_numpy=True,      # return numpy array
-        normalize_embeddings=True   # normalize vectors so cosine == dot product
-    ).astype(np.float32)           # FAISS expects float32
+def load_meta_arrays(meta_dir: Path) -> dict[str, np.ndarray | StringColumn]:
+    """
+    Memory-map every metadata column saved in meta_dir.
 
-    # -----------------------------
-    # Step 5: retrieve candidates
-    # -----------------------------
+    Inputs:
+      - meta_dir: folder written by embed_index_short.save_meta_arrays
 
-    # Retrieve more than k so deduplication has room to pick diverse results.
-    k_candidates = max(k * candidate_multiplier, k)
+    Output:
+      - dict column name -> numpy memmap (numeric columns) or StringColumn (string columns)
+    """
+    cols: dict[str, np.ndarray | StringColumn] = {}
+    for path in sorted(meta_dir.glob("*.npy")):
+        name, _, kind = path.name.removesuffix(".npy").partition(".")
+        if kind == "":
+            cols[name] = np.load(path, mmap_mode="r")
+        elif kind == "bytes":
+            cols[name] = StringColumn(
+                np.load(path, mmap_mode="r"),
+                np.load(meta_dir / f"{name}.offsets.npy", mmap_mode="r"),
+            )
+    return cols
+
+
+def print_results(
+    query: str,
+    scores: np.ndarray,
+    idxs: np.ndarray,
+    cols: dict[str, np.ndarray | StringColumn],
+    k: int,
+    dedupe_field: str,
+    k_candidates: int,
+) -> None:
+    """
+    Deduplicate one query's FAISS candidates and print the final top-k.
 
-    # FAISS search returns (scores, indices) shaped (1, k_candidates) for one query.
-    scores, idxs = index.search(q_vec, k_candidates)
-    scores = scores[0]
-    idxs = idxs[0]
+    Inputs:
+      - query: the query string (for the header)
+      - scores, idxs: FAISS results for this query, shaped (k_candidates,)
+      - cols: metadata columns aligned with FAISS rows (see load_meta_arrays)
+      - k: number of final results to return (after deduplication)
+      - dedupe_field: metadata column used to enforce diversity
+      - k_candidates: how many candidates FAISS returned (for the header)
+    """
 
     # -----------------------------
-    # Step 6: deduplicate while preserving rank order
+    # Deduplicate while preserving rank order
     # -----------------------------
 
     seen_keys = set()  # Track already-used dedupe keys.
-    results = []       # Store chosen results as tuples (score, idx, row).
+    results = []       # Store chosen results as tuples (score, idx).
 
     for score, idx in zip(scores, idxs):
         if idx < 0:  # Defensive: FAISS can return -1 if not enough neighbors
             continue
 
-        row = meta.iloc[int(idx)]  # Map FAISS index row -> metadata row
-        key = str(row.get(dedupe_field, ""))  # Extract the dedupe key and normalize to string
+        key = str(cols[dedupe_field][idx])  # Map FAISS row -> dedupe key, normalized to string
 
         if not key:  # Skip empty keys (rare)
             continue
@@ -169,13 +172,13 @@ def main(query: str, k: int, dedupe_field: str, candidate_multiplier: int) -> No
             continue
 
         seen_keys.add(key)
-        results.append((float(score), int(idx), row))
+        results.append((float(score), int(idx)))
 
         if len(results) >= k:  # Stop once we have k unique results
             break
 
     # -----------------------------
-    # Step 7: print results
+    # Print results
     # -----------------------------
 
     print("=" * 80)
@@ -186,15 +189,15 @@ def main(query: str, k: int, dedupe_field: str, candidate_multiplier: int) -> No
     print(f"Results returned after dedupe: {len(results)}")
     print("-" * 80)
 
-    for rank, (score, idx, row) in enumerate(results, start=1):
+    for rank, (score, idx) in enumerate(results, start=1):
         print(
             f"[{rank}] score={score:.4f} "
-            f"chunk_id={row.get('chunk_id', '')} "
-            f"doc_id={row.get('doc_id', '')}"
+            f"chunk_id={cols['chunk_id'][idx]} "
+            f"doc_id={cols['doc_id'][idx]}"
         )
-        print(f"     title={row.get('title', '')}")
-        print(f"     dedupe_key({dedupe_field})={row.get(dedupe_field, '')}")
-        print(f"     text_preview={safe_preview(row.get('text', ''))}")
+        print(f"     title={cols['title'][idx]}")
+        print(f"     dedupe_key({dedupe_field})={cols[dedupe_field][idx]}")
+        print(f"     text_preview={safe_preview(cols['text'][idx])}")
 
     if len(results) < k:
         print("-" * 80)
@@ -206,6 +209,135 @@ def main(query: str, k: int, dedupe_field: str, candidate_multiplier: int) -> No
             "  - Increase --candidate_multiplier to retrieve more candidates before dedupe\n"
         )
 
+
+def search_and_print(
+    model: SentenceTransformer,
+    index: faiss.Index,
+    cols: dict[str, np.ndarray | StringColumn],
+    queries: list[str],
+    k: int,
+    dedupe_field: str,
+    candidate_multiplier: int,
+) -> None:
+    """
+    Embed a batch of queries, search FAISS once for all of them, then dedupe + print each.
+
+    Inputs:
+      - model: loaded embedding model
+      - index: loaded FAISS index
+      - cols: metadata columns aligned with FAISS rows (see load_meta_arrays)
+      - queries: query strings to embed and search
+      - k: number of final results to return per query (after deduplication)
+      - dedupe_field: metadata column name used to enforce diversity
+      - candidate_multiplier: retrieve k * multiplier before dedupe to increase diversity
+    """
+    # Embed all queries in one call.
+    q_vecs = model.encode(
+        queries,                      # all queries in one call, batched internally
+        batch_size=QUERY_BATCH_SIZE,
+        convert_to_numpy=True,         # return numpy array
+        normalize_embeddings=True      # normalize vectors so cosine == dot product
+    ).astype(np.float32)              # FAISS expects float32
+
+    # Retrieve more than k so deduplication has room to pick diverse results.
+    k_candidates = max(k * candidate_multiplier, k)
+
+    # FAISS search returns (scores, indices) shaped (n_queries, k_candidates).
+    # HNSW explores at least k_candidates nodes so the extra candidates keep their recall.
+    scores, idxs = index.search(q_vecs, k_candidates, params=hnsw_search_params(index, k_candidates))
+
+    # Deduplicate + print, one query at a time.
+    for query, q_scores, q_idxs in zip(queries, scores, idxs):
+        print_results(query, q_scores, q_idxs, cols, k, dedupe_field, k_candidates)
+
+
+def main(
+    queries: list[str],
+    k: int,
+    dedupe_field: str,
+    candidate_multiplier: int,
+    server: bool = False,
+) -> None:
+    """
+    Run retrieval demo.
+
+    Steps:
+      1) Validate index and metadata files exist
+      2) Load FAISS index
+      3) Memory-map metadata columns
+      4) Validate dedupe_field exists in metadata
+      5) Load the embedding model
+      6) Search + print (see search_and_print), once for `queries` or per stdin line in server mode
+
+    Inputs:
+      - queries: query strings to embed and search
+      - k: number of final results to return per query (after deduplication)
+      - dedupe_field: metadata column name used to enforce diversity (e.g., doc_id, title)
+      - candidate_multiplier: retrieve k * multiplier before dedupe to increase diversity
+      - server: if True, ignore `queries` and answer queries read from stdin until EOF
+    """
+
+    # -----------------------------
+    # Step 1: sanity-check files exist
+    # -----------------------------
+
+    if not FAISS_INDEX_PATH.exists():
+        raise FileNotFoundError(
+            f"Missing {FAISS_INDEX_PATH}. Run: uv run python src/embed_index_short.py"
+        )
+
+    if not META_NPY_DIR.exists():
+        raise FileNotFoundError(
+            f"Missing {META_NPY_DIR}. Run: uv run python src/embed_index_short.py"
+        )
+
+    # -----------------------------
+    # Step 2: load index and metadata
+    # -----------------------------
+
+    index = faiss.read_index(str(FAISS_INDEX_PATH))  # Load FAISS index from disk
+    faiss.omp_set_num_threads(os.cpu_count() or 1)  # Let FAISS search use every core
+    # Metadata columns are memory-mapped: only rows FAISS returns are read from disk.
+    cols = load_meta_arrays(META_NPY_DIR)
+
+    # -----------------------------
+    # Step 3: validate dedupe_field
+    # -----------------------------
+
+    if dedupe_field not in cols:
+        raise ValueError(
+            f"dedupe_field='{dedupe_field}' not in metadata columns.\n"
+            f"Available columns: {list(cols)}\n"
+            f"Tip: try --dedupe_field doc_id or --dedupe_field title"
+        )
+
+    # -----------------------------
+    # Step 4: load embedding model
+    # -----------------------------
+
+    # Load the int8 ONNX embedding model once (exported locally by embed_index_short.py;
+    # raises FileNotFoundError if that has not been run yet).
+    model = load_onnx_model()
+
+    # -----------------------------
+    # Step 5: search + print
+    # -----------------------------
+
+    if not server:
+        search_and_print(model, index, cols, queries, k, dedupe_field, candidate_multiplier)
+    else:
+        # Server mode: model, index and metadata stay loaded, so each query only pays for
+        # encode + search (milliseconds) instead of process start-up and model load (seconds).
+        print("Server mode: enter one query per line (Ctrl-D to quit).")
+        while True:
+            try:
+                query = input("query> ").strip()
+            except EOFError:
+                print()
+                break
+            if query:
+                search_and_print(model, index, cols, [query], k, dedupe_field, candidate_multiplier)
+
     print("=" * 80)
     print("Done.")
 
@@ -219,11 +351,25 @@ if __name__ == "__main__":
         description="Demo: retrieve top-k unique results using FAISS + Sentence-Transformers embeddings."
     )
 
-    parser.add_argument(
+    # Exactly one of --query / --queries_file / --server must be given.
+    query_group = parser.add_mutually_exclusive_group(required=True)
+
+    query_group.add_argument(
         "--query",
         type=str,
-        required=True,
-        help="Query string to search for (required)."
+        help="Query string to search for."
+    )
+
+    query_group.add_argument(
+        "--queries_file",
+        type=str,
+        help="Text file with one query per line (blank lines are skipped); all are batch-encoded."
+    )
+
+    query_group.add_argument(
+        "--server",
+        action="store_true",
+        help="Load everything once, then answer queries typed on stdin (one per line) until Ctrl-D."
     )
 
     parser.add_argument(
@@ -249,9 +395,21 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    # Collect the queries to run.
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        if not queries:
+            parser.error(f"no queries in --queries_file {args.queries_file}")
+    elif args.query is not None:
+        queries = [args.query]
+    else:
+        queries = []  # Server mode reads queries from stdin.
+
     main(
-        query=args.query,
+        queries=queries,
         k=args.k,
         dedupe_field=args.dedupe_field,
-        candidate_multiplier=args.candidate_multiplier
+        candidate_multiplier=args.candidate_multiplier,
+        server=args.server,
     )